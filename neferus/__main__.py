@@ -20,9 +20,7 @@ from pathlib import Path
 import signal
 
 import config
-import irc
 import log
-import webhook
 
 def dumpconfig(args):
     config.dump_default_config(args.config)
@@ -34,6 +32,11 @@ def gensecret(args):
     print(secrets.token_hex(20))
 
 def run(args):
+    # pydle and aiohttp are heavyweight imports -- don't make dumpconfig/gensecret pay for
+    # them (or require them to even be installed).
+    import irc
+    import webhook
+
     if args.quiet:
         level = "ERROR"
     elif args.verbose:
@@ -47,7 +50,18 @@ def run(args):
     # fixme: handle errors
     cfg = config.read_config(args.config)
 
-    loop = asyncio.get_event_loop()
+    # uvloop's libuv-backed loop handles the IRC socket and webhook listener with far less
+    # scheduling overhead than the default loop, but it's strictly optional (and not a
+    # thing on Windows).
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        uvloop.install()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     try:
         loop.add_signal_handler(signal.SIGTERM, loop.stop)
     except NotImplementedError:
@@ -83,7 +97,7 @@ def run(args):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GitHub Webhook Powered IRC Notification Bot")
-    parser.add_argument("--config", default="config.ini", type=Path, help="path to configuration file")
+    parser.add_argument("--config", default="config.toml", type=Path, help="path to configuration file")
     parser.add_argument("--log", default="", help="path to log file")
 
     log_group = parser.add_mutually_exclusive_group()
@@ -13,9 +13,10 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
 
-import configparser
 from dataclasses import dataclass
 from pathlib import Path
+import stat
+import tomllib
 
 @dataclass
 class _ConfigItem:
@@ -26,6 +27,21 @@ class _ConfigItem:
         return self.default
 
 
+@dataclass(frozen=True)
+class Config:
+    """The fully resolved configuration -- every value has already been converted to its
+       final type, so consumers just read attributes."""
+    irc_host : str
+    irc_port : int
+    irc_nick : str
+    irc_channels : tuple
+    webhook_socket : str
+    webhook_path : Path
+    webhook_host : str
+    webhook_port : int
+    webhook_secret : bytes
+
+
 _defaults = {
     "irc": {
         "host": _ConfigItem("localhost"),
@@ -45,44 +61,72 @@ _defaults = {
     }
 }
 
-_converters = {
-    "bytes": lambda x: x.encode("ascii"),
-    "path": lambda x: Path(x),
-}
-
 _header = """
-;    This file is part of neferus
-;
-;    neferus is free software: you can redistribute it and/or modify
-;    it under the terms of the GNU Affero General Public License as published
-;    by the Free Software Foundation, either version 3 of the License, or
-;    (at your option) any later version.
-;
-;    neferus is distributed in the hope that it will be useful,
-;    but WITHOUT ANY WARRANTY; without even the implied warranty of
-;    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
-;    GNU Affero General Public License for more details.
-;
-;    You should have received a copy of the GNU Affero General Public License
-;    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
+#    This file is part of neferus
+#
+#    neferus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    neferus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
 
 """
 
 def dump_default_config(config_path):
-    with config_path.open("w") as fp:
-        fp.write(_header.lstrip())
-        for section, values in _defaults.items():
-            fp.write(f"\n[{section}]\n\n")
-            for option_name, option_value in values.items():
-                if option_value.comment:
-                    for comment_line in option_value.comment.split("\n"):
-                        fp.write(f"; {comment_line}\n")
-                fp.write(f"{option_name} = {option_value}\n\n")
+    # Assemble the whole (tiny) file in memory and write it in one go.
+    parts = [_header.lstrip()]
+    for section, values in _defaults.items():
+        parts.append(f"\n[{section}]\n\n")
+        for option_name, option_value in values.items():
+            if option_value.comment:
+                parts.extend(f"# {comment_line}\n" for comment_line in option_value.comment.split("\n"))
+            parts.append(f'{option_name} = "{option_value}"\n\n')
+    config_path.write_text("".join(parts))
+
+# Parsed configs keyed on path -> (mtime_ns, size, config). Reparsing an unchanged file
+# on reload would just redo work we already did.
+_config_cache = {}
 
 def read_config(config_path):
-    parser = configparser.ConfigParser(converters=_converters)
-    parser.read_dict(_defaults)
-    if config_path.is_file():
-        parser.read(config_path)
-        return parser
-    return None
+    # A single stat() both replaces the is_file() check and gives us the cache key.
+    try:
+        st = config_path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    cached = _config_cache.get(config_path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    # configparser regex-munges every option on each access -- overkill for a config that
+    # is read once and looked up on every webhook. tomllib gives us plain dicts, which are
+    # then frozen into a Config with all the type conversions done up front.
+    data = {section: {name: value.default for name, value in values.items()}
+            for section, values in _defaults.items()}
+    with config_path.open("rb") as fp:
+        for section, values in tomllib.load(fp).items():
+            data.setdefault(section, {}).update(values)
+
+    irc, webhook = data["irc"], data["webhook"]
+    cfg = Config(
+        irc_host=irc["host"],
+        irc_port=int(irc["port"]),
+        irc_nick=irc["nick"],
+        irc_channels=tuple(irc["channels"].split()),
+        webhook_socket=webhook["socket"].lower(),
+        webhook_path=Path(webhook["path"]),
+        webhook_host=webhook["host"],
+        webhook_port=int(webhook["port"]),
+        webhook_secret=webhook["secret"].encode("ascii"),
+    )
+    _config_cache[config_path] = (st.st_mtime_ns, st.st_size, cfg)
+    return cfg
@@ -14,42 +14,62 @@
 #    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
-import codecs
-from collections import Sequence
+import functools
 import logging
 import pydle
 import sys
 
+# A single C-level translate beats spinning up the rot13 codec machinery for each encode.
+_ROT13 = str.maketrans("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+                       "nopqrstuvwxyzabcdefghijklmNOPQRSTUVWXYZABCDEFGHIJKLM")
+
+def _build_version_string():
+    version = f"neferus - "
+    if sys.platform == "win32":
+        info = sys.getwindowsversion()
+        version += f"Windows {info.major} (build {info.build})"
+    else:
+        version += sys.platform
+    version += f" - Python {sys.version}"
+    return version.replace('\n', '')
+
+# None of this changes while we're running, so don't rebuild it (or repeat the Windows
+# version syscall) for every CTCP VERSION request.
+_VERSION_STRING = _build_version_string()
+
+@functools.lru_cache(maxsize=4)
+def _build_fallbacks(nickname):
+    """Builds the fallback nicknames for a given nick. The bot only ever has one nick, so
+       memoize the string twiddling instead of redoing it every time the client is created."""
+    nickname_inverse = nickname[::-1]
+    return (nickname_inverse,
+            nickname.translate(_ROT13),
+            nickname_inverse.translate(_ROT13))
+
+
 class IRCBot(pydle.MinimalClient):
     RECONNECT_ON_ERROR = True
     RECONNECT_MAX_ATTEMPTS = None
 
     def __init__(self, cfg, **kwargs):
-        assert cfg
-        self._cfg = cfg
-
-        nickname = cfg.get("irc", "nick")
-        nickname_inverse = nickname[::-1]
+        if cfg is None:
+            raise TypeError("cfg is required")
 
-        fallback_nicknames = []
-        fallback_nicknames.append(nickname_inverse)
-        fallback_nicknames.append(codecs.encode(nickname, "rot13"))
-        fallback_nicknames.append(codecs.encode(nickname_inverse, "rot13"))
+        # Snapshot everything we need from the config now so the connect path is just
+        # attribute loads.
+        self._host = cfg.irc_host
+        self._port = cfg.irc_port
+        self._channels = cfg.irc_channels
 
+        nickname = cfg.irc_nick
+        fallback_nicknames = list(_build_fallbacks(nickname))
         super().__init__(nickname=nickname, fallback_nicknames=fallback_nicknames, **kwargs)
 
     async def on_ctcp_time(self, by, target, contents):
         await self.ctcp_reply(by, "TIME", "PEANUT BUTTER JELLY TIME!")
 
     async def on_ctcp_version(self, by, target, contents):
-        version = f"neferus - "
-        if sys.platform == "win32":
-            info = sys.getwindowsversion()
-            version += f"Windows {info.major} (build {info.build})"
-        else:
-            version += sys.platform
-        version += f" - Python {sys.version}"
-        await self.ctcp_reply(by, "VERSION", version.replace('\n', ''))
+        await self.ctcp_reply(by, "VERSION", _VERSION_STRING)
 
     async def on_kick(self, channel, target, by, reason=None):
         if self.is_same_nick(self.nickname, target):
@@ -57,18 +77,21 @@ class IRCBot(pydle.MinimalClient):
             await self.join(channel)
 
     async def send_notification(self, notification):
-        """Sends a message to all joined channels. Multiple messages may be sent by separating
-           them with newlines."""
-        coros = (self.message(i, notification) for i in self.channels.keys())
-        await asyncio.gather(*coros)
+        """Sends a message to all joined channels. Multiple messages may be given as an
+           iterable of lines or by separating them with newlines."""
+        # Callers that already have their messages as a list can hand it over as-is --
+        # no need to join just so the lines can be split back apart down here.
+        lines = notification.splitlines() if isinstance(notification, str) else tuple(notification)
+        # Everything funnels through one socket anyway, so gather() would only add Task and
+        # Future churn on top of what is effectively a serial write.
+        for i in self.channels:
+            for line in lines:
+                await self.message(i, line)
 
     def start(self):
         logging.info("Starting IRC...")
 
-        host = self._cfg.get("irc", "host")
-        port = self._cfg.getint("irc", "port")
-        channels = self._cfg.get("irc", "channels").split(' ')
-        coro = self.connect(hostname=host, port=port, channels=channels)
+        coro = self.connect(hostname=self._host, port=self._port, channels=self._channels)
 
         # The main module will ensure that the event loop is run forever. For now, we just want to
         # connect to IRC.
@@ -13,37 +13,41 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
 
-import functools
 import logging
 import logging.handlers
 
-_level = None
 _handlers = []
 
+# One formatter serves every handler -- no sense building it per init.
+_fmt = logging.Formatter("[%(asctime)s] %(name)s %(levelname)s: %(message)s")
+
 class _Logging(logging.Logger):
+    # Stamped by init() -- class attributes spare every logger construction (including the
+    # intermediate loggers materialized for dotted names) a module-global lookup.
+    _level = logging.NOTSET
+    _handlers = ()
+
     def __init__(self, name):
-        super().__init__(name, _level)
-        for i in _handlers:
+        super().__init__(name, self._level)
+        for i in self._handlers:
             self.addHandler(i)
 
 
 def init(level, path=None):
-    global _level, _handler
-    _level = level
-
-    fmt = logging.Formatter("[%(asctime)s] %(name)s %(levelname)s: %(message)s")
     if path is not None:
         if path.exists():
             path = path.joinpath("neferus.log") if path.is_dir() else path
         else:
             path.parent.mkdir(parents=True, exist_ok=True)
         handler = logging.handlers.RotatingFileHandler(path.with_suffix(".log"))
-        handler.setFormatter(fmt)
+        handler.setFormatter(_fmt)
         _handlers.append(handler)
 
     handler = logging.StreamHandler()
-    handler.setFormatter(fmt)
+    handler.setFormatter(_fmt)
     _handlers.append(handler)
 
     logging.basicConfig(level=level, handlers=_handlers)
+    _Logging._level = level
+    _Logging._handlers = tuple(_handlers)
     logging.setLoggerClass(_Logging)
@@ -13,17 +13,32 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with neferus.  If not, see <https://www.gnu.org/licenses/>.
 
-import asyncio
 from aiohttp import web
-from hashlib import sha1
+from hashlib import sha1, sha256
 import hmac
 import logging
 import random
 
+# orjson parses GitHub's chunky push payloads a few times faster than the stdlib,
+# but don't force anyone to install it.
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 # Maimum number of commits in a push to blab about.
 _max_commits = 3
 
-_quotes = [
+# Largest request body we'll accept -- same bound request.read() enforces via the
+# default client_max_size on web.Server.
+_max_body_size = 1024 ** 2
+
+# Notification templates, compiled once -- the handlers just fill in the blanks.
+_issue_tmpl = "\x02{sender}\x02 has {action} issue #{number} ({title}) on {repo}: {url}"
+_pr_tmpl = "\x02{sender}\x02 has {action} on {repo}: {url}"
+_push_tmpl = "{author} has {push_type} {num_commits} {commits} to {ref_path}: {compare}"
+
+_quotes = (
     "YOU HAVE DIED OF DYSENTERY",
     "the cake is a lie",
     "War is where the young and stupid are tricked by the old and bitter into killing each other.",
@@ -31,30 +46,50 @@ _quotes = [
     "welcome to zombocom",
     "Hocus pocus abracadabra arse blathanna.",
     "We understanded",
-]
+)
 
 class GitHub:
+    # Event types we know how to handle. Lives on the class so instances don't rebuild it
+    # and lookups hit the (type-cached) class dict.
+    _events = frozenset(("issues", "ping", "pull_request", "push"))
+
     def __init__(self, cfg, irc, loop):
-        assert cfg and irc and loop
+        if cfg is None or irc is None or loop is None:
+            raise TypeError("cfg, irc, and loop are all required")
         self.eventloop = loop
-        self._cfg = cfg
         self._irc = irc
 
+        # Snapshot the config values we need -- the request path should be attribute
+        # loads, not mapping lookups.
+        self._socket_type = cfg.webhook_socket
+        self._host = cfg.webhook_host
+        self._port = cfg.webhook_port
+        self._path = cfg.webhook_path
+
+        # Our own RNG keeps the sass random without touching the global Mersenne Twister
+        # (and its lock) on the error path.
+        self._choose_quote = random.Random().choice
+
         self.logger = logging.getLogger(__name__)
-        self._events = {
-            "issues": self._handle_issue,
-            "ping": self._handle_ping,
-            "pull_request": self._handle_pull_request,
-            "push": self._handle_push,
-        }
+        # The HMAC key schedule only depends on the secret, which never changes while we're
+        # running. Seed a prototype once so the hot path only has to hash the request body.
+        secret = cfg.webhook_secret
+        self._hmac_proto = hmac.new(secret, digestmod=sha1) if secret else None
+        self._hmac_proto256 = hmac.new(secret, digestmod=sha256) if secret else None
 
     async def _handle_issue(self, event):
         if event["action"] not in {"opened", "deleted", "closed", "reopened"}:
             return
 
-        msg = (f"\x02{event['sender']['login']}\x02 has {event['action']} issue #"
-               f"{event['issue']['number']} ({event['issue']['title']}) on "
-               f"{event['repository']['full_name']}: {event['issue']['html_url']}")
+        issue = event["issue"]
+        msg = _issue_tmpl.format_map({
+            "sender": event["sender"]["login"],
+            "action": event["action"],
+            "number": issue["number"],
+            "title": issue["title"],
+            "repo": event["repository"]["full_name"],
+            "url": issue["html_url"],
+        })
         await self._irc.send_notification(msg)
 
     async def _handle_ping(self, event):
@@ -67,26 +102,32 @@ class GitHub:
         await self._irc.send_notification(f"\x02GitHub\x02 has pinged {what}")
 
     async def _handle_pull_request(self, event):
-        act_key = event["action"]
-        if act_key == "opened":
-            action = f"opened pull request #{event['number']} ({event['pull_request']['title']})"
-        elif act_key == "closed":
-            action = (f"{'merged' if event['pull_request']['merged'] else 'closed'}"
-                      f" pull request #{event['number']} ({event['pull_request']['title']})")
-        elif act_key == "ready_for_review":
-            action = f"marked pull request #{event['number']} ({event['pull_request']['title']}) ready for review"
-        elif act_key == "reopened":
-            action = f"reopened pull request #{event['number']} ({event['pull_request']['title']})"
-        else:
-            return
-
-        msg = (f"\x02{event['sender']['login']}\x02 has {action} on {event['repository']['full_name']}: "
-               f"{event['pull_request']['html_url']}")
+        pr = event["pull_request"]
+        number = event["number"]
+        match event["action"]:
+            case "opened":
+                action = f"opened pull request #{number} ({pr['title']})"
+            case "closed":
+                action = f"{'merged' if pr['merged'] else 'closed'} pull request #{number} ({pr['title']})"
+            case "ready_for_review":
+                action = f"marked pull request #{number} ({pr['title']}) ready for review"
+            case "reopened":
+                action = f"reopened pull request #{number} ({pr['title']})"
+            case _:
+                return
+
+        msg = _pr_tmpl.format_map({
+            "sender": event["sender"]["login"],
+            "action": action,
+            "repo": event["repository"]["full_name"],
+            "url": pr["html_url"],
+        })
         await self._irc.send_notification(msg)
 
     async def _handle_push(self, event):
         try:
-            _, ref_type, ref_name = event["ref"].split('/')
+            # maxsplit keeps nested branch names like refs/heads/feature/foo intact.
+            _, ref_type, ref_name = event["ref"].split('/', 2)
         except:
             self.logger.warning(f"Weird ass-ref in push event '{event['ref']}'")
             ref_type, ref_name = "<unknown>", "<unknown>"
@@ -96,38 +137,40 @@ class GitHub:
         if ref_type == "tags" and ref_name == "last-successful":
             return
 
+        repo = event["repository"]
         author = f"\x02{event['sender']['login']}\x02"
-        sha = lambda x: x[:7]
         num_commits = len(event["commits"])
         commits = "commit" if num_commits == 1 else "commits"
         push_type = "\x034\x02force-pushed\x0f" if event["forced"] else "pushed"
         ref_msg = f"/{ref_name}" if ref_type in {"heads", "tags"} else ""
-        ref_path = f"{event['repository']['full_name']}{ref_msg}"
+        ref_path = f"{repo['full_name']}{ref_msg}"
 
         if ref_type == "heads" and not event['deleted']:
             if num_commits:
-                msg = f"{author} has {push_type} {num_commits} {commits} to {ref_path}: {event['compare']}"
+                msg = _push_tmpl.format_map({
+                    "author": author,
+                    "push_type": push_type,
+                    "num_commits": num_commits,
+                    "commits": commits,
+                    "ref_path": ref_path,
+                    "compare": event["compare"],
+                })
             else:
                 msg = f"{author} has {push_type} to {ref_path}"
             notifications = [msg]
 
-            if ref_type == "heads" and num_commits <= _max_commits:
-                for i in range(min(num_commits, _max_commits)):
-                    commit = event["commits"][i]
-                    commit_msg = commit["message"]
-                    newline_idx = commit_msg.find("\n")
-                    if newline_idx != -1:
-                        commit_msg = commit_msg[:newline_idx]
+            if num_commits <= _max_commits:
+                for commit in event["commits"]:
+                    commit_msg = commit["message"].partition("\n")[0]
+                    notifications.append(f"{commit['author']['name']} {commit['id'][:7]} {commit_msg}")
 
-                    notifications.append(f"{commit['author']['name']} {sha(commit['id'])} {commit_msg}")
-
-            await self._irc.send_notification("\n".join(notifications))
+            await self._irc.send_notification(notifications)
         elif event['deleted']:
             msg = f"{author} has deleted {ref_path}"
             await self._irc.send_notification(msg)
         elif ref_type == "tags":
             msg = (f"{author} has {push_type} tag {ref_name} to {ref_path}: "
-                   f"{event['repository']['html_url']}/releases/tag/{ref_name}")
+                   f"{repo['html_url']}/releases/tag/{ref_name}")
             await self._irc.send_notification(msg)
         else:
             self.logger.warning(f"Unhandled push notification for {event['ref']}")
@@ -136,49 +179,87 @@ class GitHub:
     async def _on_request(self, request):
         if request.method != "POST":
             self.logger.warning(f"Invalid request '{request.method}' from {request.remote}")
-            return web.Response(status=405, text=random.choice(_quotes))
+            return web.Response(status=405, text=self._choose_quote(_quotes))
 
         if request.content_type != "application/json":
             self.logger.error(f"Invalid Content-Type '{request.content_type}' from {request.remote}")
             raise web.HTTPBadRequest()
 
-        post = request.headers
-        event_type = post.get("X-GitHub-Event")
+        # Bind the header getter once -- it gets hit three times per request.
+        hget = request.headers.get
+        event_type = hget("X-GitHub-Event")
         if not event_type:
             self.logger.error(f"Missing X-GitHub-Event from {request.remote}")
             raise web.HTTPBadRequest()
 
-        # verify hmac
-        secret = self._cfg.getbytes("webhook", "secret")
-        gh_digest = post.get("X-Hub-Signature")
-        if secret:
+        # Refuse events we don't handle before paying for the HMAC and the JSON parse --
+        # GitHub can be configured to send every event type under the sun.
+        if event_type not in self._events:
+            self.logger.warning(f"Unhandled event '{event_type}' from {request.remote}")
+            raise web.HTTPNotImplemented()
+
+        # verify hmac -- prefer the SHA-256 signature; SHA-1 is only kept for compatibility.
+        gh_digest = hget("X-Hub-Signature-256")
+        if gh_digest is not None:
+            mac_proto, sig_prefix = self._hmac_proto256, "sha256="
+        else:
+            gh_digest = hget("X-Hub-Signature")
+            mac_proto, sig_prefix = self._hmac_proto, "sha1="
+        if self._hmac_proto is not None:
             if not gh_digest:
                 self.logger.error(f"Missing X-Hub-Signature from {request.remote}")
                 raise web.HTTPForbidden()
 
-            body = await request.read()
-            my_digest = f"sha1={hmac.digest(secret, body, sha1).hex()}"
-            if not hmac.compare_digest(my_digest, gh_digest):
+            # Compare the raw digests -- hex-encoding ours just to compare strings
+            # is wasted formatting.
+            try:
+                gh_mac = bytes.fromhex(gh_digest.removeprefix(sig_prefix))
+            except ValueError:
+                self.logger.error(f"Malformed X-Hub-Signature from {request.remote}")
+                raise web.HTTPForbidden()
+
+            # Feed the MAC as the body streams in rather than buffering the whole payload
+            # first -- overlaps hashing with the network read. Unlike request.read(), the
+            # raw content iterator doesn't enforce client_max_size, so cap the body
+            # ourselves lest an unverified client balloon us out of memory.
+            mac = mac_proto.copy()
+            chunks = []
+            body_size = 0
+            async for chunk in request.content.iter_chunked(65536):
+                body_size += len(chunk)
+                if body_size > _max_body_size:
+                    self.logger.error(f"Oversized request body from {request.remote}")
+                    raise web.HTTPRequestEntityTooLarge(max_size=_max_body_size,
+                                                        actual_size=body_size)
+                mac.update(chunk)
+                chunks.append(chunk)
+            body = b"".join(chunks)
+            if not hmac.compare_digest(mac.digest(), gh_mac):
                 self.logger.error(f"HMAC Digest failed from {request.remote}")
                 raise web.HTTPForbidden()
-        elif gh_digest:
-            self.logger.error(f"Got X-Hub-Signature from {request.remote} but the secret is not configured!")
+        else:
+            if gh_digest:
+                self.logger.error(f"Got X-Hub-Signature from {request.remote} but the secret is not configured!")
+            body = await request.read()
 
         try:
-            event = await request.json()
+            event = _json_loads(body)
         except:
             self.logger.exception(f"Unable to load event JSON from {request.remote}")
             raise web.HTTPBadRequest()
         else:
             self.logger.debug(f"JSON from {request.remote}:\n{event}")
 
-        handler = self._events.get(event_type)
-        if not handler:
-            self.logger.warning(f"Unhandled event '{event_type}' from {request.remote}")
-            raise web.HTTPNotImplemented()
-
         try:
-            await handler(event)
+            match event_type:
+                case "issues":
+                    await self._handle_issue(event)
+                case "ping":
+                    await self._handle_ping(event)
+                case "pull_request":
+                    await self._handle_pull_request(event)
+                case "push":
+                    await self._handle_push(event)
         except:
             self.logger.exception(f"Error handling event '{event_type}' from {request.remote}")
             raise web.HTTPInternalServerError()
@@ -190,13 +271,10 @@ class GitHub:
         self._runner = web.ServerRunner(self._server)
         await self._runner.setup()
 
-        socket_type = self._cfg.get("webhook", "socket").lower()
-        if socket_type == "tcp":
-            host = self._cfg.get("webhook", "host")
-            port = self._cfg.getint("webhook", "port")
-            self._site = web.TCPSite(self._runner, host, port)
-        elif socket_type == "unix":
-            path = self._cfg.getpath("webhook", "path")
+        if self._socket_type == "tcp":
+            self._site = web.TCPSite(self._runner, self._host, self._port)
+        elif self._socket_type == "unix":
+            path = self._path
             if path.exists() and path.is_dir():
                 self.logger.warning("Specified a directory instead of a file as the UNIX socket path")
                 path = path.joinpath("neferus.sock")